@@ -0,0 +1,115 @@
+import asyncio
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor
+from typing import Any, Callable, Optional
+
+
+class MicroBatcher(ABC):
+    """Coalesce concurrent submissions into batches collected by a background task"""
+
+    def __init__(self, max_batch_size: int = 16, max_wait_ms: float = 5):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._in_flight: set = set()
+
+    async def start(self) -> None:
+        """Start the background batching task on the running event loop"""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Cancel the background task and any batches still in flight"""
+        tasks = list(self._in_flight)
+        if self._task is not None:
+            tasks.append(self._task)
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        # Release callers whose items never made it into a batch
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            future.cancel()
+
+    async def submit(self, item: Any) -> Any:
+        """Queue an item and wait for its result from the next batch"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    @abstractmethod
+    async def process(self, items: list) -> list:
+        """Handle a batch, returning one result per item in order"""
+
+    async def _collect(self) -> list:
+        """Wait for one item, then gather more until the batch or window fills"""
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+
+        try:
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            # Release callers already taken off the queue for this batch
+            for _, future in batch:
+                future.cancel()
+            raise
+        return batch
+
+    async def _run(self) -> None:
+        # Batches run concurrently so a slow batch never holds up the next one
+        while True:
+            batch = await self._collect()
+            task = asyncio.create_task(self._dispatch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _dispatch(self, batch: list) -> None:
+        items = [item for item, _ in batch]
+        try:
+            results = await self.process(items)
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+class EmbeddingBatcher(MicroBatcher):
+    """Batch concurrent queries into one forward pass on an executor"""
+
+    def __init__(
+        self,
+        executor: Executor,
+        embed_batch: Callable[[list], list],
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5,
+    ):
+        super().__init__(max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        self.executor = executor
+        self.embed_batch = embed_batch
+
+    async def process(self, items: list) -> list:
+        distinct = list(dict.fromkeys(items))
+        loop = asyncio.get_running_loop()
+        vectors = await loop.run_in_executor(self.executor, self.embed_batch, distinct)
+        by_text = dict(zip(distinct, vectors))
+        return [by_text[text] for text in items]
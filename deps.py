@@ -0,0 +1,148 @@
+import asyncio
+import atexit
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import httpx
+from langchain import hub
+from langchain.prompts import ChatPromptTemplate
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.prompts import (
+    HumanMessagePromptTemplate,
+    PromptTemplate,
+    SystemMessagePromptTemplate,
+)
+from langchain_openai import ChatOpenAI
+from pinecone.grpc import PineconeGRPC as Pinecone
+
+import embedding_worker
+from batching import EmbeddingBatcher
+
+# Configure logging to work with Uvicorn
+logger = logging.getLogger("cra_assistant")
+logger.setLevel(logging.INFO)
+
+# Create a handler that outputs to stdout
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.INFO)
+
+# Create a formatter
+formatter = logging.Formatter(
+    "%(asctime)s - %(name)s - %(levelname)s - %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
+)
+handler.setFormatter(formatter)
+
+# Write records from a background thread so logging never blocks the event loop
+log_listener = logging.handlers.QueueListener(
+    queue.SimpleQueue(), handler, respect_handler_level=True
+)
+
+# Add handler to logger if not already present
+if not logger.handlers:
+    logger.addHandler(logging.handlers.QueueHandler(log_listener.queue))
+    log_listener.start()
+    atexit.register(log_listener.stop)
+
+# Prevent propagation to avoid duplicate logs
+logger.propagate = False
+
+
+# Initialize components; anything needing the network is loaded by the lifespan
+prompt: Optional[ChatPromptTemplate] = None
+PROMPT_PARTS: Optional[list] = None
+
+# Embedding runs in dedicated worker processes so inference never competes
+# with the event loop; spawn keeps the workers free of this module's state
+EMBED_WORKERS = int(os.environ.get("EMBED_WORKERS", "2"))
+EMBED_POOL = ProcessPoolExecutor(
+    max_workers=EMBED_WORKERS,
+    mp_context=multiprocessing.get_context("spawn"),
+    initializer=embedding_worker.load_model,
+    initargs=(max(1, (os.cpu_count() or 1) // EMBED_WORKERS),),
+)
+
+# Coalesces concurrent queries into one forward pass; run by the app lifespan
+embedding_batcher = EmbeddingBatcher(
+    EMBED_POOL, embedding_worker.embed_batch, max_batch_size=16, max_wait_ms=5
+)
+
+# Seconds an idle pooled connection is kept open
+KEEPALIVE_EXPIRY = 30
+
+# Shared HTTP/2 keep-alive pool for OpenAI calls; closed by the app lifespan
+http_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(
+        max_keepalive_connections=50,
+        max_connections=100,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    ),
+    timeout=30,
+)
+llm = ChatOpenAI(model="gpt-4o-mini", temperature=0, http_async_client=http_client)
+
+# Initialize Pinecone; the gRPC client keeps one HTTP/2 channel per index and
+# fails a hung call after 10s rather than the SDK default of 30s
+pc = Pinecone(
+    api_key=os.environ["PINECONE_API_KEY"], environment="us-east-1", timeout=10
+)
+PINECONE_INDEX = os.environ.get("PINECONE_INDEX", "cra-index")
+DENSE_INDEX = None
+
+# Message class produced by each prompt template type that can be precompiled
+MESSAGE_TYPES = {
+    SystemMessagePromptTemplate: SystemMessage,
+    HumanMessagePromptTemplate: HumanMessage,
+}
+
+
+def compile_prompt(prompt: ChatPromptTemplate) -> Optional[list]:
+    """
+    Pre-render static prompt messages and reduce the rest to format strings
+    Returns None when the prompt needs LangChain's own formatting
+    """
+    if prompt.partial_variables:
+        return None
+
+    parts = []
+    for message in prompt.messages:
+        message_type = MESSAGE_TYPES.get(type(message))
+        template = getattr(message, "prompt", None)
+        if (
+            message_type is None
+            or not isinstance(template, PromptTemplate)
+            or template.template_format != "f-string"
+            or template.partial_variables
+        ):
+            return None
+
+        if template.input_variables:
+            parts.append((message_type, template.template))
+        else:
+            parts.append(message.format())
+    return parts
+
+
+async def load_resources() -> None:
+    """Pull the RAG prompt, resolve the Pinecone index and start the batcher"""
+    global prompt, PROMPT_PARTS, DENSE_INDEX
+
+    prompt = await asyncio.to_thread(hub.pull, "rlm/rag-prompt")
+    PROMPT_PARTS = compile_prompt(prompt)
+
+    DENSE_INDEX = await asyncio.to_thread(pc.Index, PINECONE_INDEX)
+
+    await embedding_batcher.start()
+
+
+async def close_resources() -> None:
+    """Stop background workers and release pooled connections"""
+    await embedding_batcher.stop()
+    await http_client.aclose()
+    EMBED_POOL.shutdown(cancel_futures=True)
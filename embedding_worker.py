@@ -0,0 +1,62 @@
+import os
+
+# Model libraries are imported inside the functions that need them, so the API
+# process that imports this module for the pool never loads torch or ONNX
+
+# Process-local model, loaded by the pool initializer in each worker
+_model = None
+
+
+class QuantizedSentenceTransformer:
+    """all-MiniLM-L6-v2 on CPU with int8 dynamic quantization of its linear layers"""
+
+    def __init__(self, model_name: str):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        model = SentenceTransformer(model_name, device="cpu")
+        self.model = torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+        self.model.eval()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed a batch as unit vectors, so cosine similarity is a dot product"""
+        import torch
+
+        with torch.inference_mode():
+            vectors = self.model.encode(
+                texts,
+                batch_size=len(texts),
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+            )
+        return vectors.tolist()
+
+
+def create_embedding_model(torch_threads: int = 1):
+    """
+    Prefer the int8 ONNX export (python onnx_embedding.py) when it is present
+    Either backend runs inference on torch_threads threads
+    """
+    onnx_model_dir = os.environ.get("ONNX_MODEL_DIR", "onnx")
+    if os.path.isdir(onnx_model_dir):
+        from onnx_embedding import OnnxEmbeddings
+
+        return OnnxEmbeddings(onnx_model_dir, intra_op_num_threads=torch_threads)
+
+    import torch
+
+    torch.set_num_threads(torch_threads)
+    return QuantizedSentenceTransformer("all-MiniLM-L6-v2")
+
+
+def load_model(torch_threads: int = 1) -> None:
+    """Pool initializer: load the embedding model once per worker process"""
+    global _model
+    _model = create_embedding_model(torch_threads)
+
+
+def embed_batch(texts: list[str]) -> list[list[float]]:
+    """Embed a batch of queries in a single forward pass of this worker's model"""
+    return _model.embed_documents(texts)
@@ -1,52 +1,96 @@
+import asyncio
 import json
-import logging
 import math
 import os
-import sys
-from typing import Optional
+import secrets
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
 
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from langchain import hub
-from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.prompts import ChatPromptTemplate
+from langchain_core.messages import BaseMessage
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
-from langchain_openai import ChatOpenAI
-from pinecone import Pinecone, ServerlessSpec
-from pydantic import BaseModel
+from pinecone import ServerlessSpec
+from pydantic import BaseModel, Field
 
-# Initialize components
-prompt = hub.pull("rlm/rag-prompt")
-embedding = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+import deps
+import embedding_worker
+from deps import logger
+from query_cache import QueryCache
+from timing import StageTimer
 
-# Initialize Pinecone
-pc = Pinecone(api_key=os.environ["PINECONE_API_KEY"], environment="us-east-1")
+# Monotonic time of the last OpenAI call, used to detect an idle pool
+last_llm_activity = 0.0
 
-# Configure logging to work with Uvicorn
-logger = logging.getLogger("cra_assistant")
-logger.setLevel(logging.INFO)
+# References to fire-and-forget tasks so they are not garbage collected
+background_tasks: set = set()
 
-# Create a handler that outputs to stdout
-handler = logging.StreamHandler(sys.stdout)
-handler.setLevel(logging.INFO)
+# Query embeddings, memoized for texts up to EMBED_CACHE_MAX_CHARS long; the
+# model is uncased, so the cache's case-folded keys map to identical vectors
+EMBED_CACHE_MAX_CHARS = 2000
+embedding_cache = QueryCache(max_size=4096, ttl_seconds=math.inf)
 
-# Create a formatter
-formatter = logging.Formatter(
-    "%(asctime)s - %(name)s - %(levelname)s - %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
-)
-handler.setFormatter(formatter)
+# Cache of (response, confidence) keyed by answer_cache_key
+query_cache = QueryCache(max_size=1000, ttl_seconds=300)
+
+# Token required by admin-only routes; those routes are disabled when unset
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+
+async def warm_up_embeddings() -> list[float]:
+    """
+    Load the model in every embedding worker and return one warmup vector
+    A worker that fails to load leaves the pool broken for good, so errors
+    here must abort startup rather than be logged and ignored
+    """
+    loop = asyncio.get_running_loop()
+    vectors = await asyncio.gather(
+        *(
+            loop.run_in_executor(
+                deps.EMBED_POOL, embedding_worker.embed_batch, ["warmup"]
+            )
+            for _ in range(deps.EMBED_WORKERS)
+        )
+    )
+    return vectors[0][0]
+
+
+async def warm_up_connections(vector: list[float]) -> None:
+    """Open the Pinecone and OpenAI connections before serving traffic"""
+    await asyncio.to_thread(
+        deps.DENSE_INDEX.query, namespace="__default__", top_k=1, vector=vector
+    )
+    mark_llm_activity()
+    await deps.llm.ainvoke("warmup", max_tokens=1)
+    mark_llm_activity()
 
-# Add handler to logger if not already present
-if not logger.handlers:
-    logger.addHandler(handler)
 
-# Prevent propagation to avoid duplicate logs
-logger.propagate = False
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load resources and start background workers on startup, stop on shutdown"""
+    await deps.load_resources()
+
+    try:
+        vector = await warm_up_embeddings()
+    except Exception:
+        await deps.close_resources()
+        raise
+
+    # Network warmups can fail transiently; the first requests just pay for them
+    try:
+        await warm_up_connections(vector)
+        logger.info("Warmup completed")
+    except Exception as e:
+        logger.warning(f"Warmup failed, first requests may be slow: {str(e)}")
+
+    yield
+    await deps.close_resources()
 
 
 # Create FastAPI instance
@@ -54,6 +98,7 @@ app = FastAPI(
     title="CRA Assistant API",
     description="A FastAPI application for CRA Assistant functionality",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
@@ -81,6 +126,8 @@ class CRARequest(BaseModel):
     """CRA query request model"""
 
     query: str
+    include_confidence: bool = False
+    max_tokens: int = Field(default=512, ge=1, le=4096)
 
 
 class CRAResponse(BaseModel):
@@ -90,6 +137,199 @@ class CRAResponse(BaseModel):
     confidence: Optional[float] = None
 
 
+# Helpers
+async def embed_query(text: str) -> list[float]:
+    """Embed a query in the worker pool, skipping the cache for long texts"""
+    if len(text) > EMBED_CACHE_MAX_CHARS:
+        return await run_embedding(text)
+
+    vector = embedding_cache.get(text)
+    if vector is None:
+        vector = tuple(await run_embedding(text))
+        embedding_cache.set(text, vector)
+    return list(vector)
+
+
+async def run_embedding(text: str) -> list[float]:
+    """Embed a query as part of the next batch sent to the embedding pool"""
+    return await deps.embedding_batcher.submit(text)
+
+
+def format_prompt(question: str, context: str) -> list:
+    """Build the LLM messages for a question from the precompiled prompt"""
+    if deps.PROMPT_PARTS is None:
+        return deps.prompt.format_messages(question=question, context=context)
+
+    messages = []
+    for part in deps.PROMPT_PARTS:
+        if isinstance(part, BaseMessage):
+            messages.append(part)
+        else:
+            message_type, template = part
+            messages.append(
+                message_type(
+                    content=template.format(question=question, context=context)
+                )
+            )
+    return messages
+
+
+def calculate_confidence(tokens: list) -> float:
+    """
+    Geometric mean of the per-token probabilities of an LLM completion
+    Averaging logprobs and exponentiating once replaces the former arithmetic
+    mean of exp(logprob); it weighs low-probability tokens more heavily
+    """
+    return math.exp(sum(t["logprob"] for t in tokens) / len(tokens))
+
+
+def build_context(matches: list) -> str:
+    """Join the text of retrieved matches, skipping any without text metadata"""
+    texts = [(hit.get("metadata") or {}).get("text") or "" for hit in matches]
+    skipped = texts.count("")
+    if skipped:
+        logger.warning(f"Skipped {skipped} matches without text metadata")
+    return "\n\n".join(text for text in texts if text)
+
+
+def sse_event(payload: dict, event: Optional[str] = None) -> str:
+    """Format a payload as a server-sent event frame, optionally named"""
+    frame = f"data: {json.dumps(payload)}\n\n"
+    return f"event: {event}\n{frame}" if event else frame
+
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    """Wrap an SSE frame generator in an unbuffered streaming response"""
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def stream_cached_response(
+    response_text: str, confidence: Optional[float]
+) -> AsyncIterator[str]:
+    """Replay a cached answer using the same frames as a live stream"""
+    yield sse_event({"token": response_text})
+    yield sse_event({"value": confidence}, event="confidence")
+
+
+def mark_llm_activity() -> None:
+    """Note that the OpenAI connection pool was just used"""
+    global last_llm_activity
+    last_llm_activity = time.monotonic()
+
+
+async def warm_llm_connection() -> None:
+    """Open a pooled OpenAI connection with a cheap model lookup"""
+    try:
+        await deps.llm.root_async_client.models.retrieve(deps.llm.model_name)
+    except Exception as e:
+        logger.debug("OpenAI connection warmup failed: %s", e)
+
+
+def start_llm_warmup() -> None:
+    """
+    Re-open the OpenAI connection in the background after the pool went idle
+    TLS setup then overlaps embedding and retrieval instead of delaying the LLM
+    """
+    if time.monotonic() - last_llm_activity < deps.KEEPALIVE_EXPIRY:
+        return
+
+    mark_llm_activity()
+    task = asyncio.create_task(warm_llm_connection())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+def answer_cache_key(request: CRARequest) -> str:
+    """
+    Key a cached answer by the normalized query and the options that shape it
+    Answers with and without a confidence score, or generated under different
+    max_tokens caps, are cached separately
+    """
+    return (
+        f"{request.query.strip()}\x00confidence={request.include_confidence}"
+        f"\x00max_tokens={request.max_tokens}"
+    )
+
+
+async def generate_answer(
+    messages: list, llm_options: dict
+) -> tuple[str, Optional[float]]:
+    """Run the LLM to completion and score the answer when logprobs are present"""
+    mark_llm_activity()
+    response = await deps.llm.ainvoke(messages, **llm_options)
+    mark_llm_activity()
+    response_text = response.content
+    logger.info("LLM response generated successfully")
+
+    # Calculate confidence score; refusals and empty completions have no tokens
+    confidence = None
+    tokens = (response.response_metadata.get("logprobs") or {}).get("content")
+    if tokens:
+        avg_conf = calculate_confidence(tokens)
+        logger.info(f"Average confidence: {avg_conf:.3f}")
+        confidence = avg_conf * 100
+
+    # Log the response
+    logger.debug("Response generated: %s", response_text)
+    logger.info("=" * 50)
+
+    return response_text, confidence
+
+
+async def stream_cra_response(
+    cache_key: str, messages: list, llm_options: dict
+) -> AsyncIterator[str]:
+    """
+    Stream LLM tokens as SSE frames, followed by a trailing confidence event
+    Logprobs are summed as chunks arrive, so scoring never delays a token
+    """
+    parts = []
+    logprob_sum = 0.0
+    n = 0
+
+    mark_llm_activity()
+    try:
+        async for chunk in deps.llm.astream(messages, **llm_options):
+            if chunk.content:
+                parts.append(chunk.content)
+                yield sse_event({"token": chunk.content})
+
+            tokens = (chunk.response_metadata.get("logprobs") or {}).get("content")
+            if tokens:
+                logprob_sum += sum(t["logprob"] for t in tokens)
+                n += len(tokens)
+
+        # A long stream keeps the connection busy, so idle time counts from here
+        mark_llm_activity()
+    except Exception as e:
+        logger.error(f"Error streaming CRA response: {str(e)}")
+        logger.error("=" * 50)
+        yield sse_event({"error": "Error processing query"})
+        return
+
+    response_text = "".join(parts)
+    logger.info("LLM response streamed successfully")
+
+    # Geometric mean of token probabilities, as in calculate_confidence
+    confidence = None
+    if n:
+        avg_conf = math.exp(logprob_sum / n)
+        logger.info(f"Average confidence: {avg_conf:.3f}")
+        confidence = avg_conf * 100
+
+    # Log the response
+    logger.debug("Response generated: %s", response_text)
+    logger.info("=" * 50)
+
+    query_cache.set(cache_key, (response_text, confidence))
+
+    yield sse_event({"value": confidence}, event="confidence")
+
+
 # Routes
 @app.get("/")
 async def root():
@@ -106,58 +346,91 @@ async def health_check():
 
 
 @app.post("/cra/query", response_model=CRAResponse)
-async def process_cra_query(request: CRARequest):
+async def process_cra_query(
+    request: CRARequest,
+    http_response: Response,
+    stream: bool = True,
+    debug: bool = False,
+):
     """
     Process CRA-related queries
-    This is a placeholder endpoint - you can implement your CRA logic here
+    Streams the answer as server-sent events unless called with ?stream=false
+    With ?debug=1 the per-stage timings are returned in a Server-Timing header
     """
+    timer = StageTimer(enabled=debug)
+
     # Log the incoming request details
     logger.info("=" * 50)
     logger.info("CRA QUERY REQUEST RECEIVED")
     logger.info("=" * 50)
     logger.info(f"Query: {request.query}")
-    logger.info(f"Available indexes: {pc.list_indexes().names()}")
-
-    index_name = "cra-index"
-    dense_index = pc.Index(index_name)
 
     try:
         # Process the query
         query = request.query
-        logger.info(f"Processing query: {query}")
+        logger.debug("Processing query: %s", query)
+
+        # Serve repeated questions straight from the cache
+        cache_key = answer_cache_key(request)
+        with timer.stage("cache"):
+            cached = query_cache.get(cache_key)
+        if cached is not None:
+            response_text, confidence = cached
+            logger.info("Response served from cache")
+            logger.info("=" * 50)
+
+            if stream:
+                return timer.apply(
+                    sse_response(stream_cached_response(response_text, confidence))
+                )
+            timer.apply(http_response)
+            return CRAResponse(response=response_text, confidence=confidence)
+
+        # Warm the OpenAI connection while the query is embedded and retrieved
+        start_llm_warmup()
 
         # Generate query embedding
-        query_vector = embedding.embed_query(query)
-        logger.info("Query embedded successfully")
+        with timer.stage("embed"):
+            query_vector = await embed_query(query)
+        logger.debug("Query embedded successfully")
 
         # Query Pinecone for relevant context
-        results = dense_index.query(
-            namespace="__default__", top_k=3, vector=query_vector, include_metadata=True
-        )
+        with timer.stage("pinecone"):
+            results = await asyncio.to_thread(
+                deps.DENSE_INDEX.query,
+                namespace="__default__",
+                top_k=3,
+                vector=query_vector,
+                include_metadata=True,
+            )
 
         # Format retrieved context from Pinecone
-        context = "\n\n".join([hit["metadata"]["text"] for hit in results["matches"]])
-        logger.info(f"Retrieved context with {len(results['matches'])} matches")
+        matches = results.get("matches") or []
+        context = build_context(matches)
+        logger.info(f"Retrieved context with {len(matches)} matches")
 
         # Format messages for LLM
-        messages = prompt.format_messages(question=query, context=context)
+        messages = format_prompt(query, context)
+
+        # Logprobs are only requested when the client wants a confidence score
+        llm_options = {
+            "logprobs": request.include_confidence,
+            "max_tokens": request.max_tokens,
+        }
+
+        if stream:
+            return timer.apply(
+                sse_response(stream_cra_response(cache_key, messages, llm_options))
+            )
 
         # Generate response using LLM
-        response = llm.invoke(messages, logprobs=True)
-        response_text = response.content
-        logger.info("LLM response generated successfully")
-
-        # Calculate confidence score
-        tokens = response.response_metadata["logprobs"]["content"]
-        probs = [math.exp(t["logprob"]) for t in tokens]
-        avg_conf = sum(probs) / len(probs)
-        logger.info(f"Average confidence: {avg_conf:.3f}")
+        with timer.stage("llm"):
+            response_text, confidence = await generate_answer(messages, llm_options)
 
-        # Log the response
-        logger.info(f"Response generated: {response_text}")
-        logger.info("=" * 50)
+        query_cache.set(cache_key, (response_text, confidence))
 
-        return CRAResponse(response=response_text, confidence=avg_conf * 100)
+        timer.apply(http_response)
+        return CRAResponse(response=response_text, confidence=confidence)
 
     except Exception as e:
         error_msg = f"Error processing CRA query: {str(e)}"
@@ -176,5 +449,22 @@ async def get_cra_status():
     }
 
 
+@app.get("/cra/cache_stats")
+async def get_cache_stats():
+    """Get hit/miss statistics for the query cache"""
+    return query_cache.stats()
+
+
+@app.post("/cra/reindex")
+async def reindex(x_admin_token: Optional[str] = Header(None)):
+    """Invalidate cached answers after the Pinecone index has been repopulated"""
+    if not ADMIN_TOKEN or not secrets.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+    query_cache.clear()
+    logger.info("Query cache invalidated")
+    return {"status": "cache_invalidated"}
+
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
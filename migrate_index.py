@@ -0,0 +1,53 @@
+import os
+import sys
+
+import numpy as np
+from pinecone import Pinecone, ServerlessSpec
+
+NAMESPACE = "__default__"
+DIMENSION = 384
+
+
+def normalize(values: list[float]) -> list[float]:
+    """Scale a vector to unit length so dot product equals cosine similarity"""
+    vector = np.asarray(values, dtype=np.float32)
+    vector /= np.linalg.norm(vector) + 1e-12
+    return vector.tolist()
+
+
+def migrate(source_name: str, target_name: str) -> None:
+    """Copy every vector into a dotproduct index, normalized on the way"""
+    pc = Pinecone(api_key=os.environ["PINECONE_API_KEY"])
+
+    if target_name not in pc.list_indexes().names():
+        pc.create_index(
+            name=target_name,
+            dimension=DIMENSION,
+            metric="dotproduct",
+            spec=ServerlessSpec(cloud="aws", region="us-east-1"),
+        )
+
+    source = pc.Index(source_name)
+    target = pc.Index(target_name)
+
+    copied = 0
+    for ids in source.list(namespace=NAMESPACE):
+        fetched = source.fetch(ids=ids, namespace=NAMESPACE)
+        vectors = [
+            {
+                "id": vector_id,
+                "values": normalize(vector.values),
+                "metadata": vector.metadata or {},
+            }
+            for vector_id, vector in fetched.vectors.items()
+        ]
+        target.upsert(vectors=vectors, namespace=NAMESPACE)
+        copied += len(vectors)
+
+    print(f"Copied {copied} vectors from {source_name} to {target_name}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python migrate_index.py <source-index> <target-index>")
+    migrate(sys.argv[1], sys.argv[2])
@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+import onnxruntime as ort
+from transformers import AutoTokenizer
+
+MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
+QUANTIZED_MODEL_FILE = "model_quantized.onnx"
+
+# max_seq_length of the sentence-transformers model that built the index; the
+# tokenizer's own model_max_length is 512
+MAX_SEQ_LENGTH = 256
+
+
+class OnnxEmbeddings:
+    """int8-quantized ONNX export of all-MiniLM-L6-v2 with mean pooling"""
+
+    def __init__(self, model_dir: str, intra_op_num_threads: int = 1):
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        # Each embedding worker process gets its share of the cores for intra-op
+        # parallelism; inter-op parallelism does not help this sequential graph
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_num_threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, QUANTIZED_MODEL_FILE),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def embed_query(self, text: str) -> list[float]:
+        """Embed a single query, matching the sentence-transformers output"""
+        return self.embed_documents([text])[0]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed a batch with one tokenizer call and one forward pass"""
+        inputs = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=MAX_SEQ_LENGTH,
+            return_tensors="np",
+        )
+        feeds = {
+            k: v.astype(np.int64) for k, v in inputs.items() if k in self.input_names
+        }
+        last_hidden_state = self.session.run(None, feeds)[0]
+
+        # Mean-pool over real tokens, then L2-normalize like the Normalize layer
+        mask = inputs["attention_mask"][..., np.newaxis].astype(np.float32)
+        pooled = (last_hidden_state * mask).sum(axis=1) / np.clip(
+            mask.sum(axis=1), 1e-9, None
+        )
+        pooled /= np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled.tolist()
+
+
+def export_quantized_model(output_dir: str) -> None:
+    """Export all-MiniLM-L6-v2 to ONNX and apply dynamic int8 quantization"""
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    model = ORTModelForFeatureExtraction.from_pretrained(MODEL_ID, export=True)
+    quantizer = ORTQuantizer.from_pretrained(model)
+    qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+    quantizer.quantize(save_dir=output_dir, quantization_config=qconfig)
+    AutoTokenizer.from_pretrained(MODEL_ID).save_pretrained(output_dir)
+
+
+if __name__ == "__main__":
+    export_quantized_model(os.environ.get("ONNX_MODEL_DIR", "onnx"))
@@ -58,7 +58,8 @@ async function sendMessage() {
                 'Content-Type': 'application/json',
             },
             body: JSON.stringify({
-                query: query
+                query: query,
+                include_confidence: true
             })
         });
         
@@ -66,10 +67,8 @@ async function sendMessage() {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
         
-        const data = await response.json();
-        
-        // Add bot response to chat
-        addMessage(data.response, 'bot', data.confidence);
+        // Render tokens into a single bot bubble as they stream in
+        await readStream(response);
         
     } catch (error) {
         console.error('Error:', error);
@@ -85,11 +84,72 @@ async function sendMessage() {
     }
 }
 
+// Read server-sent events from the query endpoint
+async function readStream(response) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let messageDiv = null;
+    let content = '';
+    let buffer = '';
+    
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) {
+            break;
+        }
+        
+        buffer += decoder.decode(value, { stream: true });
+        const frames = buffer.split('\n\n');
+        buffer = frames.pop();
+        
+        for (const frame of frames) {
+            const lines = frame.split('\n');
+            const eventLine = lines.find(line => line.startsWith('event: '));
+            const dataLine = lines.find(line => line.startsWith('data: '));
+            if (!dataLine) {
+                continue;
+            }
+            
+            const event = eventLine ? eventLine.slice(7) : 'message';
+            const data = JSON.parse(dataLine.slice(6));
+            
+            if (data.error) {
+                throw new Error(data.error);
+            }
+            
+            if (!messageDiv) {
+                // First frame received, replace the loading indicator with the answer
+                showLoading(false);
+                messageDiv = addMessage('', 'bot');
+            }
+            
+            if (event === 'confidence') {
+                // Trailing event sent once the full answer has been scored
+                renderMessage(messageDiv, content, 'bot', data.value);
+            } else if (data.token !== undefined) {
+                content += data.token;
+                renderMessage(messageDiv, content, 'bot');
+            }
+        }
+    }
+}
+
 // Add message to chat
 function addMessage(content, sender, confidence = null) {
     const messageDiv = document.createElement('div');
     messageDiv.className = `message-bubble ${sender}-message`;
     
+    renderMessage(messageDiv, content, sender, confidence);
+    chatMessages.appendChild(messageDiv);
+    
+    // Scroll to bottom
+    chatMessages.scrollTop = chatMessages.scrollHeight;
+    
+    return messageDiv;
+}
+
+// Render message content into an existing bubble
+function renderMessage(messageDiv, content, sender, confidence = null) {
     let messageContent = `<p>${escapeHtml(content)}</p>`;
     
     // Add confidence score for bot messages
@@ -106,9 +166,8 @@ function addMessage(content, sender, confidence = null) {
     }
     
     messageDiv.innerHTML = messageContent;
-    chatMessages.appendChild(messageDiv);
     
-    // Scroll to bottom
+    // Keep the latest content in view while streaming
     chatMessages.scrollTop = chatMessages.scrollHeight;
 }
 
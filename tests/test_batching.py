@@ -0,0 +1,89 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from batching import EmbeddingBatcher, MicroBatcher
+
+
+class BlockingBatcher(MicroBatcher):
+    """Batcher whose batches never finish, to observe cancellation"""
+
+    async def process(self, items: list) -> list:
+        await asyncio.Event().wait()
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        yield executor
+
+
+@pytest.mark.asyncio
+async def test_results_scatter_in_order_with_duplicates(executor):
+    calls = []
+
+    def embed_batch(texts):
+        calls.append(texts)
+        return [[float(len(text))] for text in texts]
+
+    batcher = EmbeddingBatcher(executor, embed_batch, max_wait_ms=50)
+    await batcher.start()
+    try:
+        results = await asyncio.gather(
+            *(batcher.submit(text) for text in ["a", "bbb", "a", "cc"])
+        )
+    finally:
+        await batcher.stop()
+
+    assert results == [[1.0], [3.0], [1.0], [2.0]]
+    assert calls == [["a", "bbb", "cc"]]
+
+
+@pytest.mark.asyncio
+async def test_exception_reaches_every_waiter(executor):
+    def embed_batch(texts):
+        raise ValueError("model failed")
+
+    batcher = EmbeddingBatcher(executor, embed_batch, max_wait_ms=50)
+    await batcher.start()
+    try:
+        results = await asyncio.gather(
+            *(batcher.submit(text) for text in ["a", "b", "a"]),
+            return_exceptions=True,
+        )
+    finally:
+        await batcher.stop()
+
+    assert len(results) == 3
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_stop_cancels_items_waiting_for_a_batch():
+    batcher = BlockingBatcher(max_wait_ms=10_000)
+    await batcher.start()
+    waiters = [asyncio.create_task(batcher.submit(i)) for i in range(3)]
+    await asyncio.sleep(0.01)
+
+    await batcher.stop()
+
+    results = await asyncio.wait_for(
+        asyncio.gather(*waiters, return_exceptions=True), timeout=1
+    )
+    assert all(isinstance(r, asyncio.CancelledError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_stop_cancels_batches_in_flight():
+    batcher = BlockingBatcher(max_batch_size=2, max_wait_ms=0)
+    await batcher.start()
+    waiters = [asyncio.create_task(batcher.submit(i)) for i in range(4)]
+    await asyncio.sleep(0.01)
+
+    await batcher.stop()
+
+    results = await asyncio.wait_for(
+        asyncio.gather(*waiters, return_exceptions=True), timeout=1
+    )
+    assert all(isinstance(r, asyncio.CancelledError) for r in results)
@@ -0,0 +1,46 @@
+import query_cache
+from query_cache import QueryCache
+
+
+def test_get_normalizes_query_text():
+    cache = QueryCache(max_size=10, ttl_seconds=60)
+    cache.set("What is RRSP?", "answer")
+
+    assert cache.get("  what is rrsp?  ") == "answer"
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(query_cache.time, "monotonic", lambda: now[0])
+    cache = QueryCache(max_size=10, ttl_seconds=5)
+    cache.set("query", "answer")
+
+    now[0] += 4.9
+    assert cache.get("query") == "answer"
+
+    now[0] += 0.2
+    assert cache.get("query") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryCache(max_size=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    # Reading "a" makes "b" the least recently used entry
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_stats_count_hits_and_misses():
+    cache = QueryCache(max_size=10, ttl_seconds=60)
+    cache.set("query", "answer")
+    cache.get("query")
+    cache.get("other")
+
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
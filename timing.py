@@ -0,0 +1,31 @@
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+
+class StageTimer:
+    """Record the wall time of each request stage for a Server-Timing header"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.stages: list[dict] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as one named stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.stages.append({"step": name, "time_ms": elapsed_ms})
+
+    def server_timing(self) -> str:
+        """Format the recorded stages, e.g. 'embed;dur=12.4, pinecone;dur=48.1'"""
+        return ", ".join(f"{s['step']};dur={s['time_ms']:.1f}" for s in self.stages)
+
+    def apply(self, response: Any) -> Any:
+        """Attach the Server-Timing header to a response when timing is enabled"""
+        if self.enabled:
+            response.headers["Server-Timing"] = self.server_timing()
+        return response